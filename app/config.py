@@ -7,22 +7,33 @@ class Settings:
     # API Keys
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     ASSEMBLYAI_API_KEY: str = os.getenv("ASSEMBLYAI_API_KEY", "")
+    ASSEMBLYAI_WEBHOOK_URL: str = os.getenv("ASSEMBLYAI_WEBHOOK_URL", "")  # e.g. https://host/api/webhooks/assemblyai
+    ASSEMBLYAI_WEBHOOK_SECRET: str = os.getenv("ASSEMBLYAI_WEBHOOK_SECRET", "")  # Required for the webhook to be used
+    ASSEMBLYAI_WEBHOOK_HEADER: str = "X-Webhook-Secret"
     
     # Database
+    # A replica set or mongos (e.g. Atlas) lets lecture results be saved in one
+    # transaction; on a standalone mongod they are written one after another
     MONGODB_URL: str = os.getenv("MONGODB_URL", "")
     DATABASE_NAME: str = "lecture_notes"
+    MONGODB_MAX_POOL_SIZE: int = int(os.getenv("MONGODB_MAX_POOL_SIZE", "200"))
+    MONGODB_MIN_POOL_SIZE: int = int(os.getenv("MONGODB_MIN_POOL_SIZE", "20"))
+    MONGODB_TIMEOUT_MS: int = 3000  # Server selection and connect timeout
+    NOTES_CACHE_TTL_SECONDS: int = 30 * 24 * 60 * 60  # 30 days
     
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "change-this-secret-key")
     
+    # CORS - comma-separated list of allowed frontend origins
+    CORS_ORIGINS: list = [
+        origin.strip()
+        for origin in os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
+        if origin.strip()
+    ]
+    
     # File Upload
     MAX_FILE_SIZE: int = 100 * 1024 * 1024  # 100 MB
+    UPLOAD_FORM_OVERHEAD: int = 64 * 1024  # Multipart boundaries and the title field
     ALLOWED_AUDIO_TYPES: list = ["audio/mpeg", "audio/wav", "audio/mp4", "audio/x-m4a", "audio/webm"]
     
-    # Paths
-    UPLOAD_DIR: str = "uploads"
-    
-settings = Settings()
-
-# Create upload directory if it doesn't exist
-os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
\ No newline at end of file
+settings = Settings()
\ No newline at end of file
@@ -1,14 +1,53 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from app.config import settings
 
 class MongoDB:
     client: AsyncIOMotorClient = None
+    # Transactions need a replica set or mongos, not a standalone mongod
+    supports_transactions: bool = False
     
     @classmethod
     async def connect_db(cls):
         """Connect to MongoDB"""
-        cls.client = AsyncIOMotorClient(settings.MONGODB_URL)
+        cls.client = AsyncIOMotorClient(
+            settings.MONGODB_URL,
+            maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=settings.MONGODB_TIMEOUT_MS,
+            connectTimeoutMS=settings.MONGODB_TIMEOUT_MS,
+            retryWrites=True,
+            # Transcripts and notes are text-heavy, compress them on the wire
+            compressors="zstd,zlib",
+            zlibCompressionLevel=6
+        )
+        # Warm up a connection and fail fast if the server is unreachable
+        hello = await cls.client.admin.command("hello")
+        cls.supports_transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
         print("✅ Connected to MongoDB")
+        if not cls.supports_transactions:
+            print("⚠️ Standalone MongoDB: lecture results are saved without a transaction")
+        
+    @classmethod
+    async def create_indexes(cls):
+        """Create indexes for lookup fields"""
+        db = cls.get_database()
+        await db.notes.create_indexes([
+            IndexModel([("lecture_id", ASCENDING)], unique=True)
+        ])
+        await db.lectures.create_indexes([
+            IndexModel([("user_id", ASCENDING), ("upload_date", DESCENDING)])
+        ])
+        await db.users.create_indexes([
+            IndexModel([("email", ASCENDING)], unique=True)
+        ])
+        await db.notes_cache.create_indexes([
+            IndexModel(
+                [("created_at", ASCENDING)],
+                expireAfterSeconds=settings.NOTES_CACHE_TTL_SECONDS
+            )
+        ])
+        print("✅ MongoDB indexes ensured")
         
     @classmethod
     async def close_db(cls):
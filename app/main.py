@@ -1,31 +1,66 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form ,Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form ,Depends, BackgroundTasks, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from datetime import datetime
-from bson import ObjectId
-import os
-import shutil
+from fastapi.responses import ORJSONResponse
+from datetime import datetime, timezone
+from bson import Binary, ObjectId
+import asyncio
+import secrets
 
 from app.config import settings
 from app.database.mongodb import MongoDB, get_db
 from app.services.stt_service import stt_service
-from app.services.gemini_service import gemini_service
+from app.services.gemini_service import get_gemini_service
 from app.routes import auth
-from app.utils.auth import get_current_user
+from app.utils.auth import get_current_user, get_user_by_email
+from app.utils.text import count_words, compress_text, decompress_text
 
 app = FastAPI(
     title="Lecture Voice-to-Notes API",
     description="Convert lecture audio to structured notes",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
+
+# Reject oversized uploads from the Content-Length header, before the body is read
+class UploadSizeLimitMiddleware:
+    """Plain ASGI middleware; requests to other paths pass straight through"""
+    
+    def __init__(self, app, path: str, max_file_size: int, form_overhead: int):
+        self.app = app
+        self.path = path
+        self.max_file_size = max_file_size
+        # The body also carries multipart framing, so allow some slack over the file limit
+        self.max_body_size = max_file_size + form_overhead
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == self.path:
+            content_length = dict(scope["headers"]).get(b"content-length", b"")
+            if content_length.isdigit() and int(content_length) > self.max_body_size:
+                response = ORJSONResponse(
+                    status_code=413,
+                    content={"detail": f"File too large. Maximum size: {self.max_file_size / (1024*1024)} MB"}
+                )
+                await response(scope, receive, send)
+                return
+        
+        await self.app(scope, receive, send)
+
+# Registered before CORS so the 413 still carries CORS headers
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    path="/api/lectures/upload",
+    max_file_size=settings.MAX_FILE_SIZE,
+    form_overhead=settings.UPLOAD_FORM_OVERHEAD
 )
 
 # CORS - Allow frontend to connect
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production: specify your frontend domain
+    allow_origins=settings.CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=600,  # Let browsers cache preflight responses for 10 minutes
 )
 
 # Include authentication routes
@@ -35,10 +70,12 @@ app.include_router(auth.router)
 @app.on_event("startup")
 async def startup_db():
     await MongoDB.connect_db()
+    await MongoDB.create_indexes()
 
 @app.on_event("shutdown")
 async def shutdown_db():
     await MongoDB.close_db()
+    await stt_service.close()
 
 # Root endpoint
 @app.get("/")
@@ -49,6 +86,7 @@ async def root():
         "endpoints": {
             "upload": "/api/lectures/upload",
             "get_notes": "/api/notes/{lecture_id}",
+            "get_transcript": "/api/transcripts/{lecture_id}",
             "list_lectures": "/api/lectures/user/{user_id}"
         }
     }
@@ -56,21 +94,89 @@ async def root():
 # Health check
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+    return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
+
+# Persist a processed lecture; the status update goes last so a lecture is
+# only marked completed once its transcript and notes exist
+async def _save_lecture_results(db, lecture_id: str, transcript_doc: dict, note_doc: dict, session=None):
+    await db.transcripts.insert_one(transcript_doc, session=session)
+    await db.notes.insert_one(note_doc, session=session)
+    await db.lectures.update_one(
+        {"_id": ObjectId(lecture_id)},
+        {"$set": {"status": "completed"}},
+        session=session
+    )
+
+# Background pipeline: transcribe, generate notes, persist
+async def _process_lecture(lecture_id: str, audio_url: str, user_id: str):
+    """
+    Transcribe an uploaded lecture and store its structured notes
+    """
+    db = get_db()
+    
+    try:
+        # Step 1: Transcribe audio
+        print("🎤 Starting transcription...")
+        transcript_data = await stt_service.transcribe(audio_url)
+        
+        # Step 2: Generate structured notes
+        print("📚 Generating structured notes...")
+        structured_notes = await get_gemini_service().generate_notes(transcript_data["text"])
+        
+        # Step 3: Save to database
+        # The full transcript lives compressed in its own collection
+        transcript_doc = {
+            "_id": ObjectId(lecture_id),
+            "blob": Binary(compress_text(transcript_data["text"])),
+            "confidence": transcript_data["confidence"]
+        }
+        
+        note_doc = {
+            "lecture_id": lecture_id,
+            "user_id": user_id,
+            "transcript": {
+                "transcript_id": lecture_id,
+                "word_count": count_words(transcript_data["text"])
+            },
+            "structured_notes": structured_notes,
+            "created_at": datetime.now(timezone.utc),
+            "last_edited": datetime.now(timezone.utc)
+        }
+        
+        # Insert transcript and notes and mark the lecture completed,
+        # atomically when the deployment supports transactions
+        if MongoDB.supports_transactions:
+            async with await MongoDB.client.start_session() as session:
+                async with session.start_transaction():
+                    await _save_lecture_results(db, lecture_id, transcript_doc, note_doc, session)
+        else:
+            await _save_lecture_results(db, lecture_id, transcript_doc, note_doc)
+        
+        print("✅ Processing complete!")
+        
+    except Exception as e:
+        # Update status to failed
+        await db.lectures.update_one(
+            {"_id": ObjectId(lecture_id)},
+            {"$set": {"status": "failed", "error": str(e)}}
+        )
+        
+        print(f"❌ Error: {str(e)}")
 
-# Upload and process lecture
-@app.post("/api/lectures/upload")
+# Upload lecture and queue it for processing
+@app.post("/api/lectures/upload", status_code=202)
 async def upload_lecture(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     title: str = Form(None),
     current_user_email: str = Depends(get_current_user)
 ):
     """
-    Upload audio file and process it into structured notes (Protected route)
+    Upload audio file and queue it for processing into structured notes (Protected route)
     """
     # Get user_id from email
     db = get_db()
-    user = await db.users.find_one({"email": current_user_email})
+    user = await get_user_by_email(current_user_email)
     user_id = str(user["_id"])
     # Validate file type
     if file.content_type not in settings.ALLOWED_AUDIO_TYPES:
@@ -79,106 +185,78 @@ async def upload_lecture(
             detail=f"Invalid file type. Allowed: {', '.join(settings.ALLOWED_AUDIO_TYPES)}"
         )
     
-    # Read file content
-    content = await file.read()
+    # Stream the upload straight to AssemblyAI, enforcing the size limit as we go
+    file_size = 0
     
-    # Validate file size
-    if len(content) > settings.MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE / (1024*1024)} MB"
-        )
+    async def read_chunks():
+        nonlocal file_size
+        while chunk := await file.read(1 << 20):
+            file_size += len(chunk)
+            
+            # Validate file size
+            if file_size > settings.MAX_FILE_SIZE:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE / (1024*1024)} MB"
+                )
+            
+            yield chunk
     
     try:
-        # Save file temporarily
-        file_extension = os.path.splitext(file.filename)[1]
-        temp_filename = f"{datetime.utcnow().timestamp()}{file_extension}"
-        temp_path = os.path.join(settings.UPLOAD_DIR, temp_filename)
-        
-        with open(temp_path, "wb") as f:
-            f.write(content)
+        audio_url = await stt_service.upload_file(read_chunks())
         
-        print(f"📁 File saved: {temp_path}")
+        print(f"📤 Audio uploaded ({file_size} bytes)")
         
         # Create lecture document
-        db = get_db()
         lecture_doc = {
             "user_id": user_id,
             "title": title or file.filename,
             "filename": file.filename,
-            "upload_date": datetime.utcnow(),
+            "upload_date": datetime.now(timezone.utc),
             "status": "processing",
-            "file_size": len(content),
-            "file_path": temp_path
+            "file_size": file_size,
+            "audio_url": audio_url
         }
         
         result = await db.lectures.insert_one(lecture_doc)
         lecture_id = str(result.inserted_id)
         
-        print(f"📝 Lecture created with ID: {lecture_id}")
-        
-        # Step 1: Transcribe audio
-        print("🎤 Starting transcription...")
-        transcript_data = await stt_service.transcribe(temp_path)
-        
-        # Step 2: Generate structured notes
-        print("📚 Generating structured notes...")
-        structured_notes = await gemini_service.generate_notes(transcript_data["text"])
-        
-        # Step 3: Save to database
-        note_doc = {
-            "lecture_id": lecture_id,
-            "user_id": user_id,
-            "transcript": {
-                "full_text": transcript_data["text"],
-                "confidence": transcript_data["confidence"],
-                "word_count": len(transcript_data["text"].split())
-            },
-            "structured_notes": structured_notes,
-            "created_at": datetime.utcnow(),
-            "last_edited": datetime.utcnow()
-        }
-        
-        await db.notes.insert_one(note_doc)
-        
-        # Update lecture status
-        await db.lectures.update_one(
-            {"_id": ObjectId(lecture_id)},
-            {"$set": {"status": "completed"}}
-        )
-        
-        print("✅ Processing complete!")
-        
-        # Clean up temporary file
-        try:
-            os.remove(temp_path)
-        except:
-            pass
-        
-        return {
-            "lecture_id": lecture_id,
-            "status": "completed",
-            "message": "Notes generated successfully",
-            "preview": {
-                "title": structured_notes.get("title"),
-                "summary": structured_notes.get("summary")
-            }
-        }
-        
+    except HTTPException:
+        raise
     except Exception as e:
-        # Update status to failed
-        if 'lecture_id' in locals():
-            await db.lectures.update_one(
-                {"_id": ObjectId(lecture_id)},
-                {"$set": {"status": "failed", "error": str(e)}}
-            )
-        
-        # Clean up file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        
         print(f"❌ Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    print(f"📝 Lecture created with ID: {lecture_id}")
+    
+    # Transcription and note generation run after the response is sent
+    background_tasks.add_task(_process_lecture, lecture_id, audio_url, user_id)
+    
+    return {
+        "lecture_id": lecture_id,
+        "status": "processing",
+        "message": "Lecture uploaded, notes are being generated"
+    }
+
+# AssemblyAI transcript completion webhook
+@app.post("/api/webhooks/assemblyai")
+async def assemblyai_webhook(payload: dict, request: Request):
+    """
+    Wake up the transcription poller when AssemblyAI reports a finished job
+    """
+    # AssemblyAI echoes the auth header we registered with the transcript
+    received_secret = request.headers.get(settings.ASSEMBLYAI_WEBHOOK_HEADER, "")
+    if not settings.ASSEMBLYAI_WEBHOOK_SECRET or not secrets.compare_digest(
+        received_secret, settings.ASSEMBLYAI_WEBHOOK_SECRET
+    ):
+        raise HTTPException(status_code=401, detail="Invalid webhook credentials")
+    
+    # The poller re-fetches the transcript itself, so the payload is only a hint
+    transcript_id = payload.get("transcript_id")
+    if transcript_id:
+        stt_service.notify_transcript(transcript_id)
+    
+    return {"received": True}
 
 # Get notes for a lecture
 @app.get("/api/notes/{lecture_id}")
@@ -186,12 +264,38 @@ async def get_notes(lecture_id: str):
     """
     Retrieve structured notes for a specific lecture
     """
+    if not ObjectId.is_valid(lecture_id):
+        raise HTTPException(status_code=400, detail="Invalid lecture ID")
+    
     db = get_db()
     
     try:
-        note = await db.notes.find_one({"lecture_id": lecture_id})
+        # Older notes still embed the full transcript - leave it on the server
+        note = await db.notes.find_one(
+            {"lecture_id": lecture_id},
+            {"transcript.full_text": 0}
+        )
         
         if not note:
+            # Notes may still be generating - report the lecture status instead
+            lecture = await db.lectures.find_one(
+                {"_id": ObjectId(lecture_id)},
+                {"status": 1, "error": 1}
+            )
+            
+            if lecture and lecture["status"] == "processing":
+                return ORJSONResponse(
+                    status_code=202,
+                    content={"lecture_id": lecture_id, "status": "processing"}
+                )
+            
+            if lecture and lecture["status"] == "failed":
+                return {
+                    "lecture_id": lecture_id,
+                    "status": "failed",
+                    "error": lecture.get("error")
+                }
+            
             raise HTTPException(status_code=404, detail="Notes not found")
         
         # Convert ObjectId to string
@@ -199,30 +303,78 @@ async def get_notes(lecture_id: str):
         
         return note
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Get the full transcript for a lecture
+@app.get("/api/transcripts/{lecture_id}")
+async def get_transcript(lecture_id: str):
+    """
+    Retrieve the full transcript text for a specific lecture
+    """
+    if not ObjectId.is_valid(lecture_id):
+        raise HTTPException(status_code=400, detail="Invalid lecture ID")
+    
+    db = get_db()
+    
+    try:
+        transcript = await db.transcripts.find_one({"_id": ObjectId(lecture_id)})
+        
+        if transcript:
+            return {
+                "lecture_id": lecture_id,
+                "full_text": decompress_text(transcript["blob"]),
+                "confidence": transcript["confidence"]
+            }
+        
+        # Older lectures still embed the transcript in their notes
+        note = await db.notes.find_one(
+            {"lecture_id": lecture_id},
+            {"transcript": 1}
+        )
+        legacy = note.get("transcript", {}) if note else {}
+        
+        if "full_text" not in legacy:
+            raise HTTPException(status_code=404, detail="Transcript not found")
+        
+        return {
+            "lecture_id": lecture_id,
+            "full_text": legacy["full_text"],
+            "confidence": legacy.get("confidence", 0)
+        }
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Get all lectures for a user
 @app.get("/api/lectures/user")
-async def get_user_lectures(current_user_email: str = Depends(get_current_user)):
+async def get_user_lectures(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    current_user_email: str = Depends(get_current_user)
+):
     """
-    Get all lectures for the current authenticated user
+    Get a page of lectures for the current authenticated user
     """
     db = get_db()
     
     try:
         # Get user_id
-        user = await db.users.find_one({"email": current_user_email})
+        user = await get_user_by_email(current_user_email)
         user_id = str(user["_id"])
+        # Audio URL (and file path on older lectures) is left out for security
         lectures = await db.lectures.find(
-            {"user_id": user_id}
-        ).sort("upload_date", -1).to_list(100)
+            {"user_id": user_id},
+            {"audio_url": 0, "file_path": 0}
+        ).sort("upload_date", -1).skip(skip).limit(limit).to_list(limit)
         
         # Convert ObjectIds to strings
         for lecture in lectures:
             lecture["_id"] = str(lecture["_id"])
-            # Remove file path from response for security
-            lecture.pop("file_path", None)
         
         return lectures
         
@@ -233,16 +385,17 @@ async def get_user_lectures(current_user_email: str = Depends(get_current_user))
 @app.delete("/api/lectures/{lecture_id}")
 async def delete_lecture(lecture_id: str):
     """
-    Delete a lecture and associated notes
+    Delete a lecture and associated notes and transcript
     """
     db = get_db()
     
     try:
-        # Delete notes
-        await db.notes.delete_many({"lecture_id": lecture_id})
-        
-        # Delete lecture
-        result = await db.lectures.delete_one({"_id": ObjectId(lecture_id)})
+        # Delete notes, transcript and lecture concurrently
+        _, _, result = await asyncio.gather(
+            db.notes.delete_many({"lecture_id": lecture_id}),
+            db.transcripts.delete_one({"_id": ObjectId(lecture_id)}),
+            db.lectures.delete_one({"_id": ObjectId(lecture_id)})
+        )
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Lecture not found")
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, status, Depends
-from datetime import datetime
+from datetime import datetime, timezone
 from bson import ObjectId
 
 from app.models.user import UserCreate, UserLogin, Token, UserResponse
@@ -7,7 +7,8 @@ from app.utils.auth import (
     get_password_hash, 
     verify_password, 
     create_access_token,
-    get_current_user
+    get_current_user,
+    get_user_by_email
 )
 from app.database.mongodb import get_db
 
@@ -31,7 +32,7 @@ async def register(user: UserCreate):
         "email": user.email,
         "password_hash": get_password_hash(user.password),
         "name": user.name,
-        "created_at": datetime.utcnow(),
+        "created_at": datetime.now(timezone.utc),
         "subscription_tier": "free"
     }
     
@@ -83,9 +84,7 @@ async def login(user: UserLogin):
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(current_user_email: str = Depends(get_current_user)):
     """Get current user information"""
-    db = get_db()
-    
-    user = await db.users.find_one({"email": current_user_email})
+    user = await get_user_by_email(current_user_email)
     
     if not user:
         raise HTTPException(
@@ -1,31 +1,27 @@
-import google.generativeai as genai
-import json
-import re
 import asyncio
-from functools import partial
+import orjson
+import hashlib
+from datetime import datetime, timezone
+from functools import cached_property, lru_cache, partial
+from itertools import islice
 from typing import Dict, Any
 from app.config import settings
+from app.database.mongodb import get_db
+from app.utils.text import WORD_RE
 
 class GeminiService:
     """AI Summarization using Google Gemini"""
     
-    def __init__(self):
+    @cached_property
+    def model(self):
+        """Gemini model, created on first use to keep the SDK out of startup"""
+        import google.generativeai as genai
+        
         genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('models/gemini-flash-latest')
+        return genai.GenerativeModel('models/gemini-flash-latest')
     
     async def generate_notes(self, transcript: str) -> Dict[str, Any]:
         """Generate structured notes from transcript (async wrapper)"""
-        # Run the sync Gemini API call in a thread pool to avoid blocking
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            None,
-            partial(self._generate_notes_sync, transcript)
-        )
-        return result
-    
-    def _generate_notes_sync(self, transcript: str) -> Dict[str, Any]:
-        """Synchronous note generation"""
-        
         # Validate transcript
         if not transcript or len(transcript.strip()) < 50:
             raise ValueError("Transcript is too short or empty")
@@ -36,52 +32,87 @@ class GeminiService:
             print(f"⚠️ Transcript truncated from {len(transcript)} to {max_chars} chars")
             transcript = transcript[:max_chars] + "\n\n[Transcript truncated due to length]"
         
-        prompt = self._create_prompt(transcript)
+        # Reuse notes previously generated for an identical transcript
+        db = get_db()
+        cache_key = hashlib.blake2b(transcript.encode(), digest_size=16).hexdigest()
+        try:
+            cached = await db.notes_cache.find_one({"_id": cache_key})
+        except Exception as e:
+            print(f"⚠️ Could not read notes cache: {e}")
+            cached = None
+        if cached:
+            print("♻️ Using cached notes")
+            return cached["notes"]
         
+        # Run the sync Gemini API call in a thread pool to avoid blocking
+        loop = asyncio.get_event_loop()
         try:
-            print("🤖 Generating structured notes with Gemini...")
-            
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.3,
-                    max_output_tokens=4096,
-                    top_p=0.8,
-                    top_k=40
-                ),
-                safety_settings=[
-                    {
-                        "category": "HARM_CATEGORY_HARASSMENT",
-                        "threshold": "BLOCK_NONE"
-                    },
-                    {
-                        "category": "HARM_CATEGORY_HATE_SPEECH",
-                        "threshold": "BLOCK_NONE"
-                    },
-                    {
-                        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                        "threshold": "BLOCK_NONE"
-                    },
-                    {
-                        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                        "threshold": "BLOCK_NONE"
-                    }
-                ]
+            notes = await loop.run_in_executor(
+                None,
+                partial(self._generate_notes_sync, transcript)
             )
-            
-            # Extract and parse JSON
-            notes = self._extract_json_from_response(response.text)
-            
-            # Validate structure
-            notes = self._validate_notes_structure(notes)
-            
-            print("✅ Notes generated successfully!")
-            return notes
-            
         except Exception as e:
             print(f"❌ Error generating notes: {e}")
-            # Return fallback structure
+            # Return fallback structure (not cached, so a retry can succeed)
             return self._create_fallback_notes(transcript, str(e))
+        
+        # Caching is best-effort; the generated notes are still good without it
+        try:
+            await db.notes_cache.update_one(
+                {"_id": cache_key},
+                {"$set": {"notes": notes, "created_at": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+        except Exception as e:
+            print(f"⚠️ Could not cache notes: {e}")
+        
+        return notes
+    
+    def _generate_notes_sync(self, transcript: str) -> Dict[str, Any]:
+        """Synchronous note generation"""
+        import google.generativeai as genai
+        
+        prompt = self._create_prompt(transcript)
+        
+        print("🤖 Generating structured notes with Gemini...")
+        
+        response = self.model.generate_content(
+            prompt,
+            generation_config=genai.types.GenerationConfig(
+                response_mime_type="application/json",
+                temperature=0.3,
+                max_output_tokens=4096,
+                top_p=0.8,
+                top_k=40
+            ),
+            safety_settings=[
+                {
+                    "category": "HARM_CATEGORY_HARASSMENT",
+                    "threshold": "BLOCK_NONE"
+                },
+                {
+                    "category": "HARM_CATEGORY_HATE_SPEECH",
+                    "threshold": "BLOCK_NONE"
+                },
+                {
+                    "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                    "threshold": "BLOCK_NONE"
+                },
+                {
+                    "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+                    "threshold": "BLOCK_NONE"
+                }
+            ]
+        )
+        
+        # JSON mode guarantees the response body is a JSON document
+        notes = orjson.loads(response.text)
+        
+        # Validate structure
+        notes = self._validate_notes_structure(notes)
+        
+        print("✅ Notes generated successfully!")
+        return notes
     
     def _create_prompt(self, transcript: str) -> str:
         """Create the prompt for Gemini"""
@@ -141,28 +172,6 @@ GUIDELINES:
 
 CRITICAL: Return ONLY the JSON object. No markdown code blocks, no explanations, no additional text."""
     
-    def _extract_json_from_response(self, response_text: str) -> Dict[str, Any]:
-        """Extract and parse JSON from Gemini response"""
-        response_text = response_text.strip()
-        
-        # Remove markdown code blocks
-        response_text = re.sub(r'^```json\s*', '', response_text)
-        response_text = re.sub(r'^```\s*', '', response_text)
-        response_text = re.sub(r'\s*```$', '', response_text)
-        response_text = response_text.strip()
-        
-        # Try to find JSON in the response
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            response_text = json_match.group(0)
-        
-        try:
-            return json.loads(response_text)
-        except json.JSONDecodeError as e:
-            print(f"❌ JSON parsing error: {e}")
-            print(f"Response preview: {response_text[:500]}")
-            raise
-    
     def _validate_notes_structure(self, notes: Dict[str, Any]) -> Dict[str, Any]:
         """Validate and fix notes structure"""
         required_keys = {
@@ -206,8 +215,8 @@ CRITICAL: Return ONLY the JSON object. No markdown code blocks, no explanations,
         """Create fallback notes when generation fails"""
         print(f"⚠️ Using fallback notes structure due to: {error_msg}")
         
-        # Create basic notes from transcript
-        words = transcript.split()
+        # Create basic notes from transcript (one extra word tells us it was cut)
+        words = [m.group(0) for m in islice(WORD_RE.finditer(transcript), 101)]
         preview = ' '.join(words[:100]) + "..." if len(words) > 100 else transcript
         
         return {
@@ -229,5 +238,7 @@ CRITICAL: Return ONLY the JSON object. No markdown code blocks, no explanations,
             "questions": []
         }
 
-# Initialize service
-gemini_service = GeminiService()
\ No newline at end of file
+# Service is created on first use
+@lru_cache
+def get_gemini_service() -> GeminiService:
+    return GeminiService()
\ No newline at end of file
@@ -1,7 +1,10 @@
-import httpx
 import asyncio
+from typing import TYPE_CHECKING, AsyncIterator
 from app.config import settings
 
+if TYPE_CHECKING:
+    import httpx
+
 class AssemblyAIService:
     """Speech-to-Text using AssemblyAI"""
     
@@ -12,31 +15,46 @@ class AssemblyAIService:
             "authorization": settings.ASSEMBLYAI_API_KEY,
             "content-type": "application/json"
         }
+        self._client: "httpx.AsyncClient" = None
+        # Completion signals from the webhook, keyed by transcript id
+        self._pending: dict = {}
+    
+    def _get_client(self) -> "httpx.AsyncClient":
+        """Get the shared HTTP client, creating it on first use"""
+        if self._client is None or self._client.is_closed:
+            import httpx
+            
+            # Keep-alive connections are reused across upload and polling calls
+            self._client = httpx.AsyncClient(
+                http2=True,
+                timeout=300.0,
+                headers={"authorization": settings.ASSEMBLYAI_API_KEY}
+            )
+        return self._client
     
-    async def upload_file(self, file_path: str) -> str:
-        """Upload audio file to AssemblyAI"""
+    async def close(self):
+        """Close the shared HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def upload_file(self, chunks: AsyncIterator[bytes]) -> str:
+        """Stream audio data to AssemblyAI"""
         upload_url = f"{self.BASE_URL}/upload"
+        client = self._get_client()
         
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            with open(file_path, "rb") as f:
-                # Read the entire file content
-                file_data = f.read()
-                
-                # Send as raw binary data, NOT as multipart form
-                response = await client.post(
-                    upload_url,
-                    headers={
-                        "authorization": settings.ASSEMBLYAI_API_KEY,
-                        # No content-type header needed, or use application/octet-stream
-                    },
-                    content=file_data  # Use 'content' not 'files'
-                )
-                response.raise_for_status()
-                return response.json()["upload_url"]
+        # Send as raw binary data, NOT as multipart form
+        response = await client.post(
+            upload_url,
+            content=chunks  # Use 'content' not 'files'
+        )
+        response.raise_for_status()
+        return response.json()["upload_url"]
     
     async def create_transcript(self, audio_url: str) -> str:
         """Create transcription job"""
         transcript_url = f"{self.BASE_URL}/transcript"
+        client = self._get_client()
         
         data = {
             "audio_url": audio_url,
@@ -46,20 +64,29 @@ class AssemblyAIService:
             "format_text": True
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                transcript_url,
-                headers=self.headers,
-                json=data
-            )
-            response.raise_for_status()
-            return response.json()["id"]
+        # Have AssemblyAI notify us on completion instead of waiting on polling
+        if settings.ASSEMBLYAI_WEBHOOK_URL and settings.ASSEMBLYAI_WEBHOOK_SECRET:
+            data["webhook_url"] = settings.ASSEMBLYAI_WEBHOOK_URL
+            data["webhook_auth_header_name"] = settings.ASSEMBLYAI_WEBHOOK_HEADER
+            data["webhook_auth_header_value"] = settings.ASSEMBLYAI_WEBHOOK_SECRET
+        
+        response = await client.post(
+            transcript_url,
+            headers=self.headers,
+            json=data
+        )
+        response.raise_for_status()
+        return response.json()["id"]
     
     async def get_transcript(self, transcript_id: str) -> dict:
-        """Poll for transcript completion"""
+        """Poll for transcript completion with exponential backoff"""
         url = f"{self.BASE_URL}/transcript/{transcript_id}"
+        client = self._get_client()
+        loop = asyncio.get_running_loop()
+        completed = self._pending[transcript_id] = loop.create_future()
+        delay = 1.0
         
-        async with httpx.AsyncClient() as client:
+        try:
             while True:
                 response = await client.get(url, headers=self.headers)
                 response.raise_for_status()
@@ -72,14 +99,24 @@ class AssemblyAIService:
                 elif status == "error":
                     raise Exception(f"Transcription failed: {result.get('error')}")
                 
-                # Wait 5 seconds before checking again
-                await asyncio.sleep(5)
+                # Back off between checks, waking early if the webhook fires
+                await asyncio.wait({completed}, timeout=delay)
+                delay = min(delay * 1.5, 15)
+                
+                # A wake-up is only good for one early check
+                if completed.done():
+                    completed = self._pending[transcript_id] = loop.create_future()
+        finally:
+            self._pending.pop(transcript_id, None)
     
-    async def transcribe(self, file_path: str) -> dict:
-        """Complete transcription pipeline"""
-        print("📤 Uploading audio file...")
-        audio_url = await self.upload_file(file_path)
-        
+    def notify_transcript(self, transcript_id: str):
+        """Wake up the poller waiting on a transcript (called by the webhook)"""
+        completed = self._pending.get(transcript_id)
+        if completed is not None and not completed.done():
+            completed.set_result(None)
+    
+    async def transcribe(self, audio_url: str) -> dict:
+        """Transcribe audio previously sent with upload_file"""
         print("🎙️ Creating transcription job...")
         transcript_id = await self.create_transcript(audio_url)
         
@@ -1,11 +1,14 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Optional
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.config import settings
 from app.models.user import TokenData
+from app.database.mongodb import get_db
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -17,6 +20,14 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 # Security scheme
 security = HTTPBearer()
 
+# Verified token cache
+TOKEN_CACHE_MAX_SIZE = 4096
+
+# User document cache
+USER_CACHE_TTL_SECONDS = 30
+USER_CACHE_MAX_SIZE = 4096
+_user_cache: dict = {}
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -30,34 +41,39 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode = data.copy()
     
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = datetime.now(timezone.utc) + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     
     return encoded_jwt
 
+@lru_cache(maxsize=TOKEN_CACHE_MAX_SIZE)
+def _decode_token(token: str) -> tuple:
+    """Verify a JWT signature once and remember its subject and expiry"""
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+    return payload.get("sub"), payload.get("exp")
+
 def decode_access_token(token: str) -> TokenData:
     """Decode and validate JWT token"""
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        
-        if email is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials"
-            )
-        
-        return TokenData(email=email)
-    
+        email, expire = _decode_token(token)
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
         )
+    
+    # Cached decodes skip jose's expiry check, so re-check it here
+    if email is None or (expire is not None and expire <= time.time()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials"
+        )
+    
+    return TokenData(email=email)
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security)
@@ -72,4 +88,21 @@ async def get_current_user(
             detail="Could not validate credentials"
         )
     
-    return token_data.email
\ No newline at end of file
+    return token_data.email
+
+async def get_user_by_email(email: str) -> Optional[dict]:
+    """Get a user document, cached for a short time per email"""
+    now = time.monotonic()
+    cached = _user_cache.get(email)
+    if cached and cached[0] > now:
+        return cached[1]
+    
+    db = get_db()
+    user = await db.users.find_one({"email": email})
+    
+    if user:
+        if len(_user_cache) >= USER_CACHE_MAX_SIZE:
+            _user_cache.clear()
+        _user_cache[email] = (now + USER_CACHE_TTL_SECONDS, user)
+    
+    return user
\ No newline at end of file
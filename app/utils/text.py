@@ -0,0 +1,17 @@
+import re
+import zstandard
+
+# A whitespace-delimited word
+WORD_RE = re.compile(r"\S+")
+
+def count_words(text: str) -> int:
+    """Count words without building a list of them"""
+    return sum(1 for _ in WORD_RE.finditer(text))
+
+def compress_text(text: str) -> bytes:
+    """Compress text with zstd for storage"""
+    return zstandard.ZstdCompressor(level=6).compress(text.encode())
+
+def decompress_text(blob: bytes) -> str:
+    """Decompress text stored with compress_text"""
+    return zstandard.ZstdDecompressor().decompress(blob).decode()
\ No newline at end of file